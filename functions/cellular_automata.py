@@ -8,7 +8,12 @@ Description:
     These functions are used to apply cellular automata algorithms to a heightmap.
 '''
 
-def cellular_automata(heightmap, algorithm, rng = None):
+import numpy as np
+
+# Probability used by add_island for each number of neighbours (0 to 8)
+ADD_ISLAND_PROBABILITIES = np.array([0.0, 0.01, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5])
+
+def cellular_automata(heightmap, algorithm, rng = None, iterations = 1):
     '''
     Applies cellular automata to the heightmap.
 
@@ -23,26 +28,75 @@ def cellular_automata(heightmap, algorithm, rng = None):
         neighbours : int
             The number of live neighbours of the cell
         and returns the value of the cell after the cellular automata rules have been applied.
+    rng : numpy random generator
+        The random number generator to use. Required by the random rules.
+    iterations : int
+        The number of times to apply the algorithm, at least 1. Default is 1.
 
     Returns
     -------
     heightmap : numpy array
         The heightmap after cellular automata has been applied.
     '''
-    # Create a copy of the heightmap
-    heightmap_copy = heightmap.copy()
+    # Check that the algorithm is applied at least once
+    if iterations < 1:
+        raise ValueError('Iterations must be at least 1.')
+
+    # Allocate the new heightmap and apply cellular automata into it
+    new_heightmap = np.empty_like(heightmap)
+    cellular_automata_into(heightmap, new_heightmap, algorithm, rng)
+
+    # Further iterations swap between two buffers, the input heightmap is left untouched
+    if iterations > 1:
+        spare = np.empty_like(heightmap)
+        for _ in range(iterations - 1):
+            cellular_automata_into(new_heightmap, spare, algorithm, rng)
+            new_heightmap, spare = spare, new_heightmap
+
+    # Return the heightmap
+    return new_heightmap
+
+def cellular_automata_into(src, dst, algorithm, rng = None):
+    '''
+    Applies cellular automata to the heightmap, writing the result into a given array.
+    This allows the caller to swap between two preallocated arrays instead of allocating
+    a new heightmap for every step.
+
+    Parameters
+    ----------
+    src : numpy array
+        The heightmap to apply cellular automata to.
+    dst : numpy array
+        The array to write the result to. Must have the same shape as src and must not be src.
+    algorithm : function
+        The algorithm to use for cellular automata. See cellular_automata.
+    rng : numpy random generator
+        The random number generator to use.
+
+    Returns
+    -------
+    dst : numpy array
+        The array the result was written to.
+    '''
+    # Use the specialized sweep for the algorithms of this module
+    sweep = _specialize(algorithm)
+    if sweep is not None:
+        sweep(src, dst, rng)
+        return dst
+
+    # Otherwise iterate over the heightmap
+    for x in range(src.shape[0]):
+        for y in range(src.shape[1]):
+            cell = src[x, y]
 
-    # Iterate over the heightmap
-    for x in range(heightmap.shape[0]):
-        for y in range(heightmap.shape[1]):
             # Get the number of live neighbours
-            neighbours = get_neighbours(heightmap, x, y)
+            neighbours = get_neighbours(src, x, y)
 
             # Determine whether the cell lives or dies
-            heightmap_copy[x, y] = algorithm(heightmap[x, y], neighbours, rng)
+            dst[x, y] = algorithm(cell, neighbours, rng)
 
-    # Return the heightmap
-    return heightmap_copy
+    # Return the array written to
+    return dst
 
 def get_neighbours(heightmap, x, y):
     '''
@@ -62,10 +116,18 @@ def get_neighbours(heightmap, x, y):
     neighbours : int
         The number of live neighbours of the cell.
     '''
+    # Interior cells have all eight neighbours inside the heightmap, so they are read directly.
+    # item returns plain Python numbers, which avoids creating a numpy scalar per read
+    if 0 < x < heightmap.shape[0] - 1 and 0 < y < heightmap.shape[1] - 1:
+        cell = heightmap.item
+        return ((cell(x - 1, y - 1) == 1) + (cell(x - 1, y) == 1) + (cell(x - 1, y + 1) == 1) +
+                (cell(x, y - 1) == 1)                             + (cell(x, y + 1) == 1) +
+                (cell(x + 1, y - 1) == 1) + (cell(x + 1, y) == 1) + (cell(x + 1, y + 1) == 1))
+
     # Initialize the number of neighbours
     neighbours = 0
 
-    # Iterate over the neighbours
+    # Iterate over the neighbours of cells on the border
     for i in range(-1, 2):
         for j in range(-1, 2):
             # If the neighbour is the cell itself, skip it
@@ -83,6 +145,134 @@ def get_neighbours(heightmap, x, y):
     # Return the number of neighbours
     return neighbours
 
+def cellular_automata_conv(heightmap, rule = 'game_of_life', rng = None, out = None, backend = 'numpy'):
+    '''
+    Applies cellular automata to the whole heightmap at once.
+    This is the vectorized counterpart of cellular_automata, the neighbours of every cell are
+    counted in one pass over the heightmap and the rule is applied as an array expression.
+    The 'numba' backend fuses the count and the rule into one compiled sweep instead, which gives
+    the same result without storing the neighbour counts. It is only faster for add_island, and
+    the sweeps are compiled on first use, so it is opt in.
+
+    Parameters
+    ----------
+    heightmap : numpy array
+        The heightmap to apply cellular automata to.
+    rule : str
+        The name of the rule to apply. Must be a key of VECTORIZED_RULES.
+    rng : numpy random generator
+        The random number generator to use. Required by the random rules.
+    out : numpy array
+        The array to write the result to. Must have the same shape as heightmap. If None, a new
+        array with the dtype of heightmap is returned.
+    backend : str
+        Either 'numpy' or 'numba'. Default is 'numpy'.
+
+    Returns
+    -------
+    heightmap : numpy array
+        The heightmap after cellular automata has been applied.
+    '''
+    # Check that the rule exists
+    if rule not in VECTORIZED_RULES:
+        raise ValueError(f'Unknown rule {rule!r}. Must be one of {sorted(VECTORIZED_RULES)}.')
+
+    # Check that the backend exists and can be used
+    if backend not in ('numpy', 'numba'):
+        raise ValueError("Backend must be one of ('numpy', 'numba').")
+
+    # Use the fused compiled sweep
+    if backend == 'numba':
+        sweep = _numba_sweep(rule)
+        if out is None:
+            out = np.empty_like(heightmap)
+        sweep(heightmap, out, rng)
+        return out
+
+    # Count the live neighbours of every cell
+    neighbours = count_neighbours(heightmap)
+
+    # Apply the rule to every cell
+    new_heightmap = VECTORIZED_RULES[rule](heightmap == 1, neighbours, rng)
+
+    # Return the heightmap in its original dtype
+    if out is None:
+        return new_heightmap.astype(heightmap.dtype)
+
+    # Or write it into the given array
+    out[...] = new_heightmap
+    return out
+
+def count_neighbours(heightmap):
+    '''
+    Counts the live neighbours of every cell in the heightmap.
+    Cells outside of the heightmap are treated as dead, matching get_neighbours.
+
+    Parameters
+    ----------
+    heightmap : numpy array
+        The heightmap to count the neighbours of.
+
+    Returns
+    -------
+    neighbours : numpy array of uint8
+        The number of live neighbours of each cell.
+    '''
+    # Count on a uint8 copy of the live cells. At 2048x2048, summing shifted slices measured about
+    # 5 times faster than scipy.ndimage.convolve and over 10 times faster than a separable float32
+    # uniform filter
+    return _neighbour_count_u8((heightmap == 1).astype(np.uint8))
+
+def _neighbour_count_u8(heightmap):
+    '''
+    Counts the live neighbours of every cell by summing eight shifted slices of the
+    zero-padded heightmap.
+
+    Parameters
+    ----------
+    heightmap : numpy array of uint8
+        The heightmap to count the neighbours of. Live cells must be 1 and dead cells 0.
+
+    Returns
+    -------
+    neighbours : numpy array of uint8
+        The number of live neighbours of each cell.
+    '''
+    # Pad with a border of dead cells
+    padded = np.pad(heightmap, 1)
+
+    return (padded[:-2, :-2] + padded[:-2, 1:-1] + padded[:-2, 2:] +
+            padded[1:-1, :-2]                    + padded[1:-1, 2:] +
+            padded[2:, :-2]  + padded[2:, 1:-1]  + padded[2:, 2:])
+
+def gol_bitpacked(packed, width = None, iterations = 1):
+    '''
+    Applies Conway's Game of Life to a bit-packed heightmap, 64 cells per uint64 word.
+    Use cellular_automata_numba.pack and unpack to convert to and from a heightmap, keeping the
+    heightmap packed across iterations avoids converting it back until it is needed.
+
+    Parameters
+    ----------
+    packed : numpy array of uint64
+        The packed heightmap, of shape (H, ceil(W / 64)).
+    width : int
+        The width of the heightmap before packing. Default is 64 cells per word.
+    iterations : int
+        The number of iterations to run. Default is 1.
+
+    Returns
+    -------
+    packed : numpy array of uint64
+        The packed heightmap after the iterations have been applied.
+    '''
+    # Check that Numba is available
+    ca_numba = _import_numba('the bit-packed Game of Life')
+
+    if width is None:
+        width = packed.shape[1] * 64
+
+    return ca_numba.run_gol_packed(packed, iterations, width)
+
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
 # Cellular automata algorithms
@@ -105,26 +295,8 @@ def game_of_life(cell, neighbours, rng = None):
     cell : int
         The value of the cell after the cellular automata rules have been applied.
     '''
-    # If the cell is alive
-    if cell == 1:
-        # If the cell has less than 2 live neighbours, it dies
-        if neighbours < 2:
-            cell = 0
-        # If the cell has more than 3 live neighbours, it dies
-        elif neighbours > 3:
-            cell = 0
-        # If the cell has 2 or 3 live neighbours, it lives
-        else:
-            cell = 1
-
-    # If the cell is dead
-    else:
-        # If the cell has exactly 3 live neighbours, it lives
-        if neighbours == 3:
-            cell = 1
-
-    # Return the cell
-    return cell
+    # A cell with 3 live neighbours lives, a live cell with 2 live neighbours survives
+    return int((neighbours == 3) | ((cell == 1) & (neighbours == 2)))
 
 def brians_brain(cell, neighbours, rng = None):
         '''      
@@ -144,19 +316,8 @@ def brians_brain(cell, neighbours, rng = None):
         cell : int
             The value of the cell after the cellular automata rules have been applied.
         '''
-        # If the cell is alive
-        if cell == 1:
-            # The cell dies
-            cell = 0
-
-        # If the cell is dead
-        else:
-            # If the cell has 6, 7, 8 live neighbours, it lives
-            if neighbours >= 6:
-                cell = 1
-
-        # Return the cell
-        return cell
+        # Live cells die and dead cells with 6, 7 or 8 live neighbours come alive
+        return int((cell == 0) & (neighbours >= 6))
 
 def add_island(cell, neighbours, rng = None):
     '''
@@ -290,4 +451,208 @@ def zoom_imperfection(cell, neighbours, rng = None):
                 cell = 0
 
     # Return the cell
-    return cell
\ No newline at end of file
+    return cell
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
+# Vectorized cellular automata algorithms
+# These take a boolean array of live cells and an array of live neighbour counts and
+# return a boolean array of the live cells after the rules have been applied.
+
+def game_of_life_vec(alive, neighbours, rng = None):
+    '''
+    Vectorized version of game_of_life.
+    A cell lives if it has exactly 3 live neighbours, or if it is alive and has 2.
+
+    Parameters
+    ----------
+    alive : numpy array of bools
+        Whether each cell is alive.
+    neighbours : numpy array of ints
+        The number of live neighbours of each cell, see count_neighbours.
+
+    Returns
+    -------
+    alive : numpy array of bools
+        Whether each cell is alive after the cellular automata rules have been applied.
+    '''
+    return (neighbours == 3) | (alive & (neighbours == 2))
+
+def brians_brain_vec(alive, neighbours, rng = None):
+    '''
+    Vectorized version of brians_brain.
+    Live cells always die and dead cells with 6, 7 or 8 live neighbours come alive.
+
+    Parameters
+    ----------
+    alive : numpy array of bools
+        Whether each cell is alive.
+    neighbours : numpy array of ints
+        The number of live neighbours of each cell, see count_neighbours.
+
+    Returns
+    -------
+    alive : numpy array of bools
+        Whether each cell is alive after the cellular automata rules have been applied.
+    '''
+    return ~alive & (neighbours >= 6)
+
+def remove_ocean_vec(alive, neighbours, rng = None):
+    '''
+    Vectorized version of remove_ocean.
+    Dead cells with no live neighbours have a 50% chance to come alive.
+
+    Parameters
+    ----------
+    alive : numpy array of bools
+        Whether each cell is alive.
+    neighbours : numpy array of ints
+        The number of live neighbours of each cell, see count_neighbours.
+    rng : numpy random generator
+        The random number generator to use.
+
+    Returns
+    -------
+    alive : numpy array of bools
+        Whether each cell is alive after the cellular automata rules have been applied.
+    '''
+    # Check if the random number generator is None
+    if rng is None:
+        raise ValueError("Random number generator is required for this algorithm. The random number generator cannot be None.")
+
+    return alive | ((neighbours == 0) & (rng.random(alive.shape) < 0.5))
+
+def zoom_imperfection_vec(alive, neighbours, rng = None):
+    '''
+    Vectorized version of zoom_imperfection.
+    Cells with some live neighbours have a 5% chance to flip state.
+
+    Parameters
+    ----------
+    alive : numpy array of bools
+        Whether each cell is alive.
+    neighbours : numpy array of ints
+        The number of live neighbours of each cell, see count_neighbours.
+    rng : numpy random generator
+        The random number generator to use.
+
+    Returns
+    -------
+    alive : numpy array of bools
+        Whether each cell is alive after the cellular automata rules have been applied.
+    '''
+    # Check if the random number generator is None
+    if rng is None:
+        raise ValueError("Random number generator is required for this algorithm. The random number generator cannot be None.")
+
+    return alive ^ ((neighbours > 0) & (rng.random(alive.shape) < 0.05))
+
+def add_island_vec(alive, neighbours, rng = None):
+    '''
+    Vectorized version of add_island.
+    Live cells die with the probability given for their number of dead neighbours and
+    dead cells come alive with the probability given for their number of live neighbours.
+    A single random array is drawn for the whole heightmap.
+
+    Parameters
+    ----------
+    alive : numpy array of bools
+        Whether each cell is alive.
+    neighbours : numpy array of ints
+        The number of live neighbours of each cell, see count_neighbours.
+    rng : numpy random generator
+        The random number generator to use.
+
+    Returns
+    -------
+    alive : numpy array of bools
+        Whether each cell is alive after the cellular automata rules have been applied.
+    '''
+    # Check if the random number generator is None
+    if rng is None:
+        raise ValueError("Random number generator is required for this algorithm. The random number generator cannot be None.")
+
+    # Draw one random number per cell
+    random = rng.random(alive.shape)
+
+    # The probability table is not linear in the number of neighbours, so the two cases
+    # cannot be folded into a single comparison and are looked up separately
+    survives = random >= ADD_ISLAND_PROBABILITIES[8 - neighbours]
+    is_born = random < ADD_ISLAND_PROBABILITIES[neighbours]
+
+    return np.where(alive, survives, is_born)
+
+# Vectorized rules by name, used by cellular_automata_conv
+VECTORIZED_RULES = {
+    'game_of_life': game_of_life_vec,
+    'brians_brain': brians_brain_vec,
+    'add_island': add_island_vec,
+    'remove_ocean': remove_ocean_vec,
+    'zoom_imperfection': zoom_imperfection_vec,
+}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
+# Specialization of cellular_automata for the algorithms of this module
+
+def _specialize(algorithm):
+    '''
+    Returns a function that applies the algorithm to a whole heightmap, or None if the algorithm
+    is not one of the algorithms of this module.
+    The algorithms of this module are applied with their vectorized rule, see cellular_automata_conv.
+
+    Parameters
+    ----------
+    algorithm : function
+        The algorithm passed to cellular_automata.
+
+    Returns
+    -------
+    sweep : function or None
+        A function taking (src, dst, rng) that writes one step of src into dst.
+    '''
+    # Only specialize the functions defined here, not others that share their name
+    name = getattr(algorithm, '__name__', None)
+    if name not in VECTORIZED_RULES or globals().get(name) is not algorithm:
+        return None
+
+    def sweep(src, dst, rng):
+        cellular_automata_conv(src, name, rng = rng, out = dst)
+    return sweep
+
+def _import_numba(feature):
+    '''
+    Imports cellular_automata_numba when it is first needed, so importing this module does not
+    import Numba. Raises ImportError naming the feature if Numba is not installed.
+    '''
+    try:
+        from . import cellular_automata_numba
+    except ImportError:
+        raise ImportError(f'Numba is required for {feature}.') from None
+    return cellular_automata_numba
+
+def _numba_sweep(name):
+    '''
+    Returns a function taking (src, dst, rng) that runs the compiled Numba sweep of the
+    algorithm with the given name. The random rules draw one random number per cell up front.
+    '''
+    ca_numba = _import_numba('the numba backend')
+
+    if name == 'game_of_life':
+        return lambda src, dst, rng: ca_numba._gol_sweep(src, dst)
+    if name == 'brians_brain':
+        return lambda src, dst, rng: ca_numba._brains_sweep(src, dst)
+
+    def sweep(src, dst, rng):
+        # Check if the random number generator is None
+        if rng is None:
+            raise ValueError("Random number generator is required for this algorithm. The random number generator cannot be None.")
+
+        random = rng.random(src.shape)
+        if name == 'add_island':
+            ca_numba._addisland_sweep(src, dst, random, ADD_ISLAND_PROBABILITIES)
+        elif name == 'remove_ocean':
+            ca_numba._ocean_sweep(src, dst, random)
+        else:
+            ca_numba._zoom_sweep(src, dst, random)
+    return sweep
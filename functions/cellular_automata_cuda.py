@@ -0,0 +1,199 @@
+'''
+File: cellular_automata_cuda.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    CuPy versions of the cellular automata algorithms and the Terrain layers, running on a CUDA GPU.
+    The neighbours are counted with a convolution on the device and the rule is applied with an
+    elementwise kernel, the heightmap only leaves the device once all iterations are done.
+    Cells outside of the heightmap are treated as dead, matching cellular_automata.get_neighbours.
+
+    This module is experimental, it has not been run on a GPU yet, so Terrain does not offer it as
+    a backend. No device memory is allocated when it is imported, so importing it without a usable
+    GPU only fails once it is used. tests/test_cellular_automata_cuda.py compares it with the
+    NumPy rules wherever CuPy is installed.
+'''
+
+import numpy as np
+import cupy as cp
+from cupyx.scipy import ndimage
+
+# Kernel used to count the live neighbours of every cell in a single convolution, copied to the
+# device by cellular_automata_cuda
+NEIGHBOUR_KERNEL = np.array([[1, 1, 1],
+                             [1, 0, 1],
+                             [1, 1, 1]], dtype = np.uint8)
+
+# Elementwise rules by name, taking the cells and their live neighbour counts
+CUDA_RULES = {
+    'game_of_life': cp.ElementwiseKernel(
+        'uint8 cell, uint8 neighbours', 'uint8 new_cell',
+        'new_cell = (neighbours == 3) || (cell == 1 && neighbours == 2)',
+        'game_of_life_rule'),
+    'brians_brain': cp.ElementwiseKernel(
+        'uint8 cell, uint8 neighbours', 'uint8 new_cell',
+        'new_cell = cell == 0 && neighbours >= 6',
+        'brians_brain_rule'),
+}
+
+def cellular_automata_cuda(heightmap, rule = 'game_of_life', iterations = 1):
+    '''
+    Applies cellular automata to the heightmap on the GPU for a number of iterations.
+    Two device buffers are allocated once and swapped between iterations.
+
+    Parameters
+    ----------
+    heightmap : numpy or cupy array
+        The heightmap to apply cellular automata to. Live cells must be 1 and dead cells 0.
+    rule : str
+        The name of the rule to apply. Must be a key of CUDA_RULES.
+    iterations : int
+        The number of iterations to run. Default is 1.
+
+    Returns
+    -------
+    heightmap : numpy or cupy array of uint8
+        The heightmap after cellular automata has been applied, on the same device as the input.
+    '''
+    # Check that the rule exists
+    if rule not in CUDA_RULES:
+        raise ValueError(f'Unknown rule {rule!r}. Must be one of {sorted(CUDA_RULES)}.')
+    apply_rule = CUDA_RULES[rule]
+
+    # Copy the live cells and the kernel to the device and allocate the other buffers
+    src = (cp.asarray(heightmap) == 1).astype(cp.uint8)
+    kernel = cp.asarray(NEIGHBOUR_KERNEL)
+    dst = cp.empty_like(src)
+    neighbours = cp.empty_like(src)
+
+    for _ in range(iterations):
+        ndimage.convolve(src, kernel, output = neighbours, mode = 'constant', cval = 0)
+        apply_rule(src, neighbours, dst)
+        src, dst = dst, src
+
+    # Return the heightmap on the device it came from
+    if isinstance(heightmap, np.ndarray):
+        return cp.asnumpy(src)
+    return src
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
+# Terrain layers, GPU versions of the layers of pipeline
+
+# Rule identifiers understood by the layer kernel
+ADD_ISLAND = 0
+REMOVE_OCEAN = 1
+ZOOM_IMPERFECTION = 2
+
+# One thread per cell of dst. The source heightmap is read at (x / zoom, y / zoom), so the zoom
+# layer enlarges the heightmap and applies its rule in the same pass, other layers use a zoom of 1
+_LAYER_SOURCE = r'''
+extern "C" __global__
+void random_layer(const unsigned char* src, const float* random, unsigned char* dst,
+                  const int H, const int W, const int zoom, const int rule,
+                  const float* probabilities)
+{
+    const int y = blockIdx.x * blockDim.x + threadIdx.x;
+    const int x = blockIdx.y * blockDim.y + threadIdx.y;
+    const int zoomed_H = H * zoom;
+    const int zoomed_W = W * zoom;
+    if (x >= zoomed_H || y >= zoomed_W) {
+        return;
+    }
+
+    // Count the live neighbours, cells outside of the heightmap are dead
+    int neighbours = 0;
+    for (int i = -1; i <= 1; i++) {
+        for (int j = -1; j <= 1; j++) {
+            const int xx = x + i;
+            const int yy = y + j;
+            if ((i != 0 || j != 0) && xx >= 0 && xx < zoomed_H && yy >= 0 && yy < zoomed_W) {
+                neighbours += src[(xx / zoom) * W + yy / zoom] == 1;
+            }
+        }
+    }
+
+    const bool alive = src[(x / zoom) * W + y / zoom] == 1;
+    const float r = random[x * zoomed_W + y];
+
+    // Apply the rule, 0 is ADD_ISLAND, 1 is REMOVE_OCEAN and 2 is ZOOM_IMPERFECTION
+    bool cell;
+    if (rule == 0) {
+        cell = alive ? r >= probabilities[8 - neighbours] : r < probabilities[neighbours];
+    } else if (rule == 1) {
+        cell = alive || (neighbours == 0 && r < 0.5f);
+    } else {
+        cell = alive != (neighbours > 0 && r < 0.05f);
+    }
+    dst[x * zoomed_W + y] = cell;
+}
+'''
+_LAYER_KERNEL = cp.RawKernel(_LAYER_SOURCE, 'random_layer')
+
+# Threads per block, 32 along a row so each warp reads consecutive cells
+_BLOCK = (32, 8)
+
+def _run_layer(src, dst, zoom_factor, rule, rng, probabilities):
+    '''
+    Runs the layer kernel with the given rule identifier, writing into dst.
+    One random number per cell of dst is drawn from the device generator. The layers that do not
+    use probabilities pass None.
+    '''
+    if probabilities is None:
+        probabilities = cp.zeros(1, dtype = cp.float32)
+    H, W = src.shape
+    zoomed_H, zoomed_W = dst.shape
+    random = rng.random(dst.shape, dtype = cp.float32)
+    grid = ((zoomed_W + _BLOCK[0] - 1) // _BLOCK[0], (zoomed_H + _BLOCK[1] - 1) // _BLOCK[1])
+    _LAYER_KERNEL(grid, _BLOCK, (src, random, dst, cp.int32(H), cp.int32(W),
+                                 cp.int32(zoom_factor), cp.int32(rule), probabilities))
+
+def zoom(src, dst, zoom_factor, rng):
+    '''
+    Enlarges src by the zoom factor into dst and applies the zoom imperfection rule, in one pass.
+
+    Parameters
+    ----------
+    src : cupy array of uint8
+        The contiguous heightmap to zoom in on. Live cells must be 1 and dead cells 0.
+    dst : cupy array of uint8
+        The contiguous array to write the zoomed heightmap to. Must be zoom_factor times larger
+        than src along each axis.
+    zoom_factor : int
+        The factor by which to zoom in.
+    rng : cupy random generator
+        The random number generator to use.
+    '''
+    _run_layer(src, dst, zoom_factor, ZOOM_IMPERFECTION, rng, None)
+
+def add_island(src, dst, rng, probabilities):
+    '''
+    Applies the add island rule to src, writing the result into dst.
+
+    Parameters
+    ----------
+    src : cupy array of uint8
+        The contiguous heightmap to add an island to. Live cells must be 1 and dead cells 0.
+    dst : cupy array of uint8
+        The contiguous array to write the result to. Must have the same shape as src.
+    rng : cupy random generator
+        The random number generator to use.
+    probabilities : numpy array of floats
+        The probability for each number of neighbours, see cellular_automata.ADD_ISLAND_PROBABILITIES.
+    '''
+    _run_layer(src, dst, 1, ADD_ISLAND, rng, cp.asarray(probabilities, dtype = cp.float32))
+
+def remove_ocean(src, dst, rng):
+    '''
+    Applies the remove ocean rule to src, writing the result into dst.
+
+    Parameters
+    ----------
+    src : cupy array of uint8
+        The contiguous heightmap to remove ocean from. Live cells must be 1 and dead cells 0.
+    dst : cupy array of uint8
+        The contiguous array to write the result to. Must have the same shape as src.
+    rng : cupy random generator
+        The random number generator to use.
+    '''
+    _run_layer(src, dst, 1, REMOVE_OCEAN, rng, None)
@@ -5,11 +5,19 @@
 
 import numpy as np
 
+def _random(rng, shape):
+    """Draw uniform numbers in [0, 1) from rng, or from numpy's global
+    generator if rng is None."""
+    if rng is None:
+        return np.random.rand(*shape)
+    return rng.random(shape)
+
 def interpolant(t):
     return t*t*t*(t*(t*6 - 15) + 10)
 
 def generate_perlin_noise_2d(
-        shape, res, tileable=(False, False), interpolant=interpolant
+        shape, res, tileable=(False, False), interpolant=interpolant,
+        rng=None
 ):
     """Generate a 2D numpy array of perlin noise.
 
@@ -23,6 +31,8 @@ def generate_perlin_noise_2d(
             (tuple of two bools). Defaults to (False, False).
         interpolant: The interpolation function, defaults to
             t*t*t*(t*(t*6 - 15) + 10).
+        rng: The numpy random generator drawing the gradients. Defaults
+            to None, which uses numpy's global generator.
 
     Returns:
         A numpy array of shape shape with the generated noise.
@@ -35,7 +45,7 @@ def generate_perlin_noise_2d(
     grid = np.mgrid[0:res[0]:delta[0], 0:res[1]:delta[1]]\
              .transpose(1, 2, 0) % 1
     # Gradients
-    angles = 2*np.pi*np.random.rand(res[0]+1, res[1]+1)
+    angles = 2*np.pi*_random(rng, (res[0]+1, res[1]+1))
     gradients = np.dstack((np.cos(angles), np.sin(angles)))
     if tileable[0]:
         gradients[-1,:] = gradients[0,:]
@@ -46,11 +56,13 @@ def generate_perlin_noise_2d(
     g10 = gradients[d[0]:     ,    :-d[1]]
     g01 = gradients[    :-d[0],d[1]:     ]
     g11 = gradients[d[0]:     ,d[1]:     ]
-    # Ramps
-    n00 = np.sum(np.dstack((grid[:,:,0]  , grid[:,:,1]  )) * g00, 2)
-    n10 = np.sum(np.dstack((grid[:,:,0]-1, grid[:,:,1]  )) * g10, 2)
-    n01 = np.sum(np.dstack((grid[:,:,0]  , grid[:,:,1]-1)) * g01, 2)
-    n11 = np.sum(np.dstack((grid[:,:,0]-1, grid[:,:,1]-1)) * g11, 2)
+    # Ramps, the dot products are written out so no stacked copy of the
+    # grid is built for each corner
+    x, y = grid[:,:,0], grid[:,:,1]
+    n00 = x    *g00[:,:,0] + y    *g00[:,:,1]
+    n10 = (x-1)*g10[:,:,0] + y    *g10[:,:,1]
+    n01 = x    *g01[:,:,0] + (y-1)*g01[:,:,1]
+    n11 = (x-1)*g11[:,:,0] + (y-1)*g11[:,:,1]
     # Interpolation
     t = interpolant(grid)
     n0 = n00*(1-t[:,:,0]) + t[:,:,0]*n10
@@ -60,7 +72,7 @@ def generate_perlin_noise_2d(
 def generate_fractal_noise_2d(
         shape, res, octaves=1, persistence=0.5,
         lacunarity=2, tileable=(False, False),
-        interpolant=interpolant
+        interpolant=interpolant, rng=None, dtype=np.float64
 ):
     """Generate a 2D numpy array of fractal noise.
 
@@ -77,6 +89,11 @@ def generate_fractal_noise_2d(
             (tuple of two bools). Defaults to (False, False).
         interpolant: The, interpolation function, defaults to
             t*t*t*(t*(t*6 - 15) + 10).
+        rng: The numpy random generator drawing the gradients. Defaults
+            to None, which uses numpy's global generator.
+        dtype: The dtype of the returned array, the octaves are summed
+            in place into a single array of this dtype. Defaults to
+            np.float64.
 
     Returns:
         A numpy array of fractal noise and of shape shape generated by
@@ -86,20 +103,23 @@ def generate_fractal_noise_2d(
         ValueError: If shape is not a multiple of
             (lacunarity**(octaves-1)*res).
     """
-    noise = np.zeros(shape)
+    noise = np.zeros(shape, dtype=dtype)
     frequency = 1
     amplitude = 1
     for _ in range(octaves):
-        noise += amplitude * generate_perlin_noise_2d(
-            shape, (frequency*res[0], frequency*res[1]), tileable, interpolant
+        octave = generate_perlin_noise_2d(
+            shape, (frequency*res[0], frequency*res[1]), tileable, interpolant,
+            rng
         )
+        octave *= amplitude
+        noise += octave
         frequency *= lacunarity
         amplitude *= persistence
     return noise
 
 def generate_perlin_noise_3d(
         shape, res, tileable=(False, False, False),
-        interpolant=interpolant
+        interpolant=interpolant, rng=None
 ):
     """Generate a 3D numpy array of perlin noise.
 
@@ -113,6 +133,8 @@ def generate_perlin_noise_3d(
             (tuple of three bools). Defaults to (False, False, False).
         interpolant: The interpolation function, defaults to
             t*t*t*(t*(t*6 - 15) + 10).
+        rng: The numpy random generator drawing the gradients. Defaults
+            to None, which uses numpy's global generator.
 
     Returns:
         A numpy array of shape shape with the generated noise.
@@ -126,8 +148,8 @@ def generate_perlin_noise_3d(
     grid = np.mgrid[0:res[0]:delta[0],0:res[1]:delta[1],0:res[2]:delta[2]]
     grid = grid.transpose(1, 2, 3, 0) % 1
     # Gradients
-    theta = 2*np.pi*np.random.rand(res[0] + 1, res[1] + 1, res[2] + 1)
-    phi = 2*np.pi*np.random.rand(res[0] + 1, res[1] + 1, res[2] + 1)
+    theta = 2*np.pi*_random(rng, (res[0] + 1, res[1] + 1, res[2] + 1))
+    phi = 2*np.pi*_random(rng, (res[0] + 1, res[1] + 1, res[2] + 1))
     gradients = np.stack(
         (np.sin(phi)*np.cos(theta), np.sin(phi)*np.sin(theta), np.cos(phi)),
         axis=3
@@ -168,7 +190,8 @@ def generate_perlin_noise_3d(
 
 def generate_fractal_noise_3d(
         shape, res, octaves=1, persistence=0.5, lacunarity=2,
-        tileable=(False, False, False), interpolant=interpolant
+        tileable=(False, False, False), interpolant=interpolant, rng=None,
+        dtype=np.float64
 ):
     """Generate a 3D numpy array of fractal noise.
 
@@ -185,6 +208,11 @@ def generate_fractal_noise_3d(
             (tuple of three bools). Defaults to (False, False, False).
         interpolant: The, interpolation function, defaults to
             t*t*t*(t*(t*6 - 15) + 10).
+        rng: The numpy random generator drawing the gradients. Defaults
+            to None, which uses numpy's global generator.
+        dtype: The dtype of the returned array, the octaves are summed
+            in place into a single array of this dtype. Defaults to
+            np.float64.
 
     Returns:
         A numpy array of fractal noise and of shape shape generated by
@@ -194,16 +222,19 @@ def generate_fractal_noise_3d(
         ValueError: If shape is not a multiple of
             (lacunarity**(octaves-1)*res).
     """
-    noise = np.zeros(shape)
+    noise = np.zeros(shape, dtype=dtype)
     frequency = 1
     amplitude = 1
     for _ in range(octaves):
-        noise += amplitude * generate_perlin_noise_3d(
+        octave = generate_perlin_noise_3d(
             shape,
             (frequency*res[0], frequency*res[1], frequency*res[2]),
             tileable,
-            interpolant
+            interpolant,
+            rng
         )
+        octave *= amplitude
+        noise += octave
         frequency *= lacunarity
         amplitude *= persistence
     return noise
\ No newline at end of file
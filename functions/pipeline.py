@@ -0,0 +1,168 @@
+'''
+File: pipeline.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    Numba compiled versions of the Terrain layers, used by the 'numba' backend of Terrain.
+    Every layer writes into an array given by the caller, so Terrain can swap between two
+    preallocated buffers. The zoom layer reads the smaller heightmap through index arithmetic
+    instead of building the enlarged heightmap first, fusing the enlargement with the zoom
+    imperfection rule.
+
+    The random numbers come from one xoshiro256** generator per row, seeded from the layer seed
+    and the row index. The result of a layer therefore only depends on its seed, not on the number
+    of threads the rows are split over.
+'''
+
+import numpy as np
+from numba import njit, prange
+
+from .cellular_automata_numba import (pad, _neighbours, _random_rule, _NO_PROBABILITIES,
+                                      ADD_ISLAND, REMOVE_OCEAN, ZOOM_IMPERFECTION)
+
+# Constants of the splitmix64 generator used to seed the row generators
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+# Scale turning the top 53 bits of a random word into a float in [0, 1)
+_TO_UNIT = 1.0 / (1 << 53)
+
+@njit(cache = True, inline = 'always')
+def _splitmix64(x):
+    '''
+    Advances a splitmix64 state, returning the new state and the next random word.
+    '''
+    x = x + _GOLDEN_GAMMA
+    z = x
+    z = (z ^ (z >> np.uint64(30))) * _MIX_1
+    z = (z ^ (z >> np.uint64(27))) * _MIX_2
+    return x, z ^ (z >> np.uint64(31))
+
+@njit(cache = True, inline = 'always')
+def _rotl(x, k):
+    '''
+    Rotates a 64 bit word left by k bits.
+    '''
+    return (x << np.uint64(k)) | (x >> np.uint64(64 - k))
+
+@njit(cache = True, inline = 'always')
+def _row_state(seed, row):
+    '''
+    Returns the xoshiro256** state for a row of a layer with the given seed.
+    '''
+    x = np.uint64(seed) ^ (np.uint64(row) * _GOLDEN_GAMMA)
+    x, s0 = _splitmix64(x)
+    x, s1 = _splitmix64(x)
+    x, s2 = _splitmix64(x)
+    x, s3 = _splitmix64(x)
+    return s0, s1, s2, s3
+
+@njit(cache = True, inline = 'always')
+def _random(s0, s1, s2, s3):
+    '''
+    Advances a xoshiro256** state, returning a float in [0, 1) and the new state.
+    '''
+    result = _rotl(s1 * np.uint64(5), 7) * np.uint64(9)
+    t = s1 << np.uint64(17)
+    s2 ^= s0
+    s3 ^= s1
+    s1 ^= s2
+    s0 ^= s3
+    s2 ^= t
+    s3 = _rotl(s3, 45)
+    return (result >> np.uint64(11)) * _TO_UNIT, s0, s1, s2, s3
+
+@njit(cache = True, parallel = True, boundscheck = False)
+def zoom(src, dst, zoom_factor, seed):
+    '''
+    Enlarges src by the zoom factor into dst and applies the zoom imperfection rule, in one pass.
+    Cell (x, y) of the enlarged heightmap is cell (x // zoom_factor, y // zoom_factor) of src.
+
+    Parameters
+    ----------
+    src : numpy array
+        The heightmap to zoom in on. Live cells must be 1 and dead cells 0.
+    dst : numpy array
+        The array to write the zoomed heightmap to. Must be zoom_factor times larger than src
+        along each axis.
+    zoom_factor : int
+        The factor by which to zoom in.
+    seed : int
+        The seed of the random numbers of this layer.
+    '''
+    padded = pad(src)
+    H, W = dst.shape
+
+    # Columns of padded holding the enlarged columns y - 1, y and y + 1, computed once as they
+    # are the same for every row. Floor division maps the columns just outside of the heightmap
+    # onto the padding
+    y = np.arange(W)
+    left = (y - 1) // zoom_factor + 1
+    centre = y // zoom_factor + 1
+    right = (y + 1) // zoom_factor + 1
+
+    for x in prange(H):
+        s0, s1, s2, s3 = _row_state(seed, x)
+
+        # Rows of padded holding the enlarged rows x - 1, x and x + 1
+        above = padded[(x - 1) // zoom_factor + 1]
+        row = padded[x // zoom_factor + 1]
+        below = padded[(x + 1) // zoom_factor + 1]
+        for j in range(W):
+            l, c, r = left[j], centre[j], right[j]
+            neighbours = (above[l] + above[c] + above[r] +
+                          row[l]              + row[r] +
+                          below[l] + below[c] + below[r])
+
+            random, s0, s1, s2, s3 = _random(s0, s1, s2, s3)
+            dst[x, j] = _random_rule(ZOOM_IMPERFECTION, row[c], neighbours, random, _NO_PROBABILITIES)
+
+@njit(cache = True, parallel = True, boundscheck = False)
+def _random_layer(src, dst, rule, seed, probabilities):
+    '''
+    Writes one step of the random rule with the given identifier of src into dst.
+    See cellular_automata_numba._random_rule.
+    '''
+    padded = pad(src)
+    H, W = src.shape
+    for x in prange(H):
+        s0, s1, s2, s3 = _row_state(seed, x)
+        for y in range(W):
+            random, s0, s1, s2, s3 = _random(s0, s1, s2, s3)
+            dst[x, y] = _random_rule(rule, padded[x + 1, y + 1], _neighbours(padded, x + 1, y + 1),
+                                     random, probabilities)
+
+@njit(cache = True)
+def add_island(src, dst, seed, probabilities):
+    '''
+    Applies the add island rule to src, writing the result into dst.
+
+    Parameters
+    ----------
+    src : numpy array
+        The heightmap to add an island to. Live cells must be 1 and dead cells 0.
+    dst : numpy array
+        The array to write the result to. Must have the same shape as src.
+    seed : int
+        The seed of the random numbers of this layer.
+    probabilities : numpy array of floats
+        The probability for each number of neighbours, see cellular_automata.ADD_ISLAND_PROBABILITIES.
+    '''
+    _random_layer(src, dst, ADD_ISLAND, seed, probabilities)
+
+@njit(cache = True)
+def remove_ocean(src, dst, seed):
+    '''
+    Applies the remove ocean rule to src, writing the result into dst.
+
+    Parameters
+    ----------
+    src : numpy array
+        The heightmap to remove ocean from. Live cells must be 1 and dead cells 0.
+    dst : numpy array
+        The array to write the result to. Must have the same shape as src.
+    seed : int
+        The seed of the random numbers of this layer.
+    '''
+    _random_layer(src, dst, REMOVE_OCEAN, seed, _NO_PROBABILITIES)
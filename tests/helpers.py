@@ -0,0 +1,15 @@
+'''
+File: helpers.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    Helpers shared by the tests.
+'''
+
+import numpy as np
+
+def random_heightmap(shape, seed = 0, density = 0.35):
+    '''
+    Returns a heightmap of the given shape with about density of its cells alive.
+    '''
+    return (np.random.default_rng(seed).random(shape) < density).astype(np.uint8)
@@ -0,0 +1,112 @@
+'''
+File: test_cellular_automata.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    Checks that the vectorized rules give exactly the same heightmaps as the scalar rules run
+    through the get_neighbours loop.
+    Run from the repository root with: python -m unittest discover tests
+'''
+
+import unittest
+
+import numpy as np
+
+import functions.cellular_automata as ca
+
+# Random numbers drawn for the random rules. Besides uniform numbers they include the thresholds
+# of the rules and the numbers just either side of them, so < and >= are told apart
+THRESHOLDS = np.concatenate([ca.ADD_ISLAND_PROBABILITIES, [0.05, 0.5]])
+EDGES = np.concatenate([THRESHOLDS, np.nextafter(THRESHOLDS, -1), np.nextafter(THRESHOLDS, 2)])
+EDGES = EDGES[(EDGES >= 0) & (EDGES < 1)]
+
+class FixedRandom:
+    '''
+    Stands in for a numpy random generator, returning given random numbers.
+    '''
+
+    def __init__(self, random):
+        self._random = random
+
+    def random(self, size = None):
+        return self._random
+
+def heightmaps():
+    '''
+    Returns sparse, even and dense heightmaps, which between them give live and dead cells every
+    number of live neighbours from 0 to 8.
+    '''
+    rng = np.random.default_rng(0)
+    return [(rng.random((24, 31)) < density).astype(np.uint8) for density in (0.15, 0.5, 0.85)]
+
+def draws(shape, seed):
+    '''
+    Returns one random number per cell, half of them uniform and half from EDGES.
+    '''
+    rng = np.random.default_rng(seed)
+    return np.where(rng.random(shape) < 0.5, rng.random(shape), rng.choice(EDGES, shape))
+
+def scalar_step(heightmap, algorithm, random):
+    '''
+    Applies the scalar algorithm to every cell through get_neighbours, giving each cell its own
+    random number.
+    '''
+    result = np.empty_like(heightmap)
+    for x in range(heightmap.shape[0]):
+        for y in range(heightmap.shape[1]):
+            neighbours = ca.get_neighbours(heightmap, x, y)
+            result[x, y] = algorithm(int(heightmap[x, y]), neighbours, FixedRandom(random[x, y]))
+    return result
+
+class TestVectorizedRules(unittest.TestCase):
+
+    def test_heightmaps_cover_every_count(self):
+        # The other tests rely on every (cell, neighbours) pair appearing
+        pairs = set()
+        for heightmap in heightmaps():
+            counts = ca.count_neighbours(heightmap)
+            pairs |= set(zip(heightmap.ravel().tolist(), counts.ravel().tolist()))
+        self.assertEqual(pairs, {(cell, count) for cell in (0, 1) for count in range(9)})
+
+    def test_count_neighbours_matches_get_neighbours(self):
+        for heightmap in heightmaps() + [np.ones((1, 1), dtype = np.uint8), np.ones((1, 5), dtype = np.uint8)]:
+            expected = np.array([[ca.get_neighbours(heightmap, x, y) for y in range(heightmap.shape[1])]
+                                 for x in range(heightmap.shape[0])])
+            np.testing.assert_array_equal(ca.count_neighbours(heightmap), expected)
+
+    def test_matches_scalar_rules(self):
+        for name, vectorized in ca.VECTORIZED_RULES.items():
+            for index, heightmap in enumerate(heightmaps()):
+                with self.subTest(rule = name, heightmap = index):
+                    random = draws(heightmap.shape, index)
+                    expected = scalar_step(heightmap, getattr(ca, name), random)
+
+                    result = vectorized(heightmap == 1, ca.count_neighbours(heightmap), FixedRandom(random))
+                    np.testing.assert_array_equal(result.astype(np.uint8), expected)
+
+                    # cellular_automata_conv must give the same cells
+                    result = ca.cellular_automata_conv(heightmap, name, rng = FixedRandom(random))
+                    np.testing.assert_array_equal(result, expected)
+
+    def test_random_rules_need_rng(self):
+        heightmap = heightmaps()[0]
+        for name in ('add_island', 'remove_ocean', 'zoom_imperfection'):
+            with self.subTest(rule = name):
+                with self.assertRaises(ValueError):
+                    ca.cellular_automata_conv(heightmap, name)
+
+class TestCellularAutomata(unittest.TestCase):
+
+    def test_iterations(self):
+        heightmap = heightmaps()[1]
+        expected = heightmap
+        for _ in range(3):
+            expected = ca.cellular_automata(expected, ca.game_of_life)
+        np.testing.assert_array_equal(ca.cellular_automata(heightmap, ca.game_of_life, iterations = 3), expected)
+
+    def test_rejects_no_iterations(self):
+        with self.assertRaises(ValueError):
+            ca.cellular_automata(heightmaps()[0], ca.game_of_life, iterations = 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+'''
+File: test_cellular_automata_cuda.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    Checks the CuPy layers against the vectorized NumPy rules. Skipped without CuPy and a GPU.
+    Run from the repository root with: python -m unittest discover tests
+'''
+
+import unittest
+
+import numpy as np
+
+import functions.cellular_automata as ca
+from helpers import random_heightmap
+
+try:
+    import cupy as cp
+    import functions.cellular_automata_cuda as ca_cuda
+except ImportError:
+    raise unittest.SkipTest('CuPy is not installed.')
+
+try:
+    if cp.cuda.runtime.getDeviceCount() < 1:
+        raise unittest.SkipTest('No GPU is available.')
+except cp.cuda.runtime.CUDARuntimeError:
+    raise unittest.SkipTest('No GPU is available.')
+
+# Shapes with odd sizes, single rows and columns, and sizes that are not multiples of the blocks
+SHAPES = [(1, 1), (1, 70), (70, 1), (5, 7), (37, 91), (130, 129)]
+
+# Vectorized NumPy rules matching each rule of CUDA_RULES
+RULES = {'game_of_life': ca.game_of_life_vec, 'brians_brain': ca.brians_brain_vec}
+
+def reference(heightmap, rule, iterations):
+    '''
+    Applies the vectorized NumPy rule with the given name, one iteration at a time.
+    '''
+    for _ in range(iterations):
+        heightmap = RULES[rule](heightmap == 1, ca.count_neighbours(heightmap)).astype(np.uint8)
+    return heightmap
+
+class TestCellularAutomataCuda(unittest.TestCase):
+
+    def test_matches_numpy(self):
+        for rule in RULES:
+            for shape in SHAPES:
+                for iterations in (1, 2, 5):
+                    with self.subTest(rule = rule, shape = shape, iterations = iterations):
+                        heightmap = random_heightmap(shape)
+                        result = ca_cuda.cellular_automata_cuda(heightmap, rule, iterations)
+                        np.testing.assert_array_equal(result, reference(heightmap, rule, iterations))
+
+    def test_stays_on_device(self):
+        heightmap = random_heightmap((37, 91))
+        result = ca_cuda.cellular_automata_cuda(cp.asarray(heightmap), 'game_of_life', 3)
+        self.assertIsInstance(result, cp.ndarray)
+        np.testing.assert_array_equal(cp.asnumpy(result), reference(heightmap, 'game_of_life', 3))
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            ca_cuda.cellular_automata_cuda(random_heightmap((5, 7)), 'add_island')
+
+class TestLayers(unittest.TestCase):
+
+    def layer(self, run, heightmap, zoom_factor = 1):
+        '''
+        Runs a layer on a copy of the heightmap on the device, returning the result on the host.
+        '''
+        src = cp.asarray(heightmap)
+        dst = cp.empty((heightmap.shape[0] * zoom_factor, heightmap.shape[1] * zoom_factor), dtype = cp.uint8)
+        run(src, dst, cp.random.default_rng(0))
+        return cp.asnumpy(dst)
+
+    def test_add_island_probabilities(self):
+        # With all probabilities 0 every cell survives and none are born, with all 1 it is reversed
+        for shape in SHAPES:
+            with self.subTest(shape = shape):
+                heightmap = random_heightmap(shape)
+                result = self.layer(lambda src, dst, rng: ca_cuda.add_island(src, dst, rng, np.zeros(9)), heightmap)
+                np.testing.assert_array_equal(result, heightmap)
+                result = self.layer(lambda src, dst, rng: ca_cuda.add_island(src, dst, rng, np.ones(9)), heightmap)
+                np.testing.assert_array_equal(result, 1 - heightmap)
+
+    def test_remove_ocean_keeps_land(self):
+        # Land stays land and only ocean without land around it can become land
+        for shape in SHAPES:
+            with self.subTest(shape = shape):
+                heightmap = random_heightmap(shape)
+                result = self.layer(ca_cuda.remove_ocean, heightmap)
+                changed = result != heightmap
+                np.testing.assert_array_equal(result[heightmap == 1], 1)
+                np.testing.assert_array_equal(ca.count_neighbours(heightmap)[changed], 0)
+
+    def test_zoom_enlarges(self):
+        # The zoom imperfection rule only changes cells with live neighbours, every other cell
+        # must be the cell of the small heightmap it was enlarged from
+        for shape in SHAPES:
+            for zoom_factor in (1, 2, 3):
+                with self.subTest(shape = shape, zoom_factor = zoom_factor):
+                    heightmap = random_heightmap(shape, density = 0.05)
+                    enlarged = heightmap.repeat(zoom_factor, 0).repeat(zoom_factor, 1)
+                    result = self.layer(lambda src, dst, rng: ca_cuda.zoom(src, dst, zoom_factor, rng),
+                                        heightmap, zoom_factor)
+                    isolated = ca.count_neighbours(enlarged) == 0
+                    np.testing.assert_array_equal(result[isolated], enlarged[isolated])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+'''
+File: test_cellular_automata_numba.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    Checks that the Numba runners give exactly the same heightmaps as the vectorized NumPy rules.
+    Run from the repository root with: python -m unittest discover tests
+'''
+
+import unittest
+
+import numpy as np
+
+import functions.cellular_automata as ca
+from helpers import random_heightmap
+
+try:
+    import functions.cellular_automata_numba as ca_numba
+except ImportError:
+    raise unittest.SkipTest('Numba is not installed.')
+
+# Shapes with odd sizes, single rows and columns, and sizes that are not multiples of the tiles
+SHAPES = [(1, 1), (1, 70), (70, 1), (5, 7), (37, 91), (130, 129), (200, 257)]
+
+def reference_gol(heightmap, iterations):
+    '''
+    Applies the Game of Life rule with the vectorized NumPy rule, one iteration at a time.
+    '''
+    for _ in range(iterations):
+        heightmap = ca.game_of_life_vec(heightmap == 1, ca.count_neighbours(heightmap)).astype(np.uint8)
+    return heightmap
+
+class TestNumbaBackend(unittest.TestCase):
+
+    def test_matches_numpy_backend(self):
+        # Both backends draw one random number per cell from the generator, in the same order
+        for shape in SHAPES:
+            heightmap = random_heightmap(shape)
+            for rule in ca.VECTORIZED_RULES:
+                with self.subTest(shape = shape, rule = rule):
+                    expected = ca.cellular_automata_conv(heightmap, rule, rng = np.random.default_rng(1))
+                    result = ca.cellular_automata_conv(heightmap, rule, rng = np.random.default_rng(1),
+                                                       backend = 'numba')
+                    np.testing.assert_array_equal(result, expected)
+
+class TestRunGolPacked(unittest.TestCase):
+
+    # Widths around the 64 cell words, the last word of a row is only partly used
+    WIDTHS = [1, 2, 63, 64, 65, 127, 128, 129, 200]
+
+    def test_pack_round_trip(self):
+        for width in self.WIDTHS:
+            with self.subTest(width = width):
+                heightmap = random_heightmap((9, width))
+                np.testing.assert_array_equal(ca_numba.unpack(ca_numba.pack(heightmap), width), heightmap)
+
+    def test_matches_reference(self):
+        for height in (1, 2, 17):
+            for width in self.WIDTHS:
+                heightmap = random_heightmap((height, width), seed = width)
+                packed = ca_numba.pack(heightmap)
+                for iterations in (1, 6):
+                    with self.subTest(shape = (height, width), iterations = iterations):
+                        result = ca_numba.unpack(ca_numba.run_gol_packed(packed, iterations, width), width)
+                        np.testing.assert_array_equal(result, reference_gol(heightmap, iterations))
+
+    def test_padding_stays_dead(self):
+        # A full row next to the padding would bring cells to life in it if the mask was missing
+        heightmap = np.ones((3, 70), dtype = np.uint8)
+        packed = ca.gol_bitpacked(ca_numba.pack(heightmap), 70)
+        self.assertFalse(np.any(ca_numba.unpack(packed, 128)[:, 70:]))
+
+class TestRunGolActive(unittest.TestCase):
+
+    def test_matches_reference(self):
+        for shape in SHAPES:
+            heightmap = random_heightmap(shape)
+            for tile in (1, 3, ca_numba.ACTIVE_TILE):
+                with self.subTest(shape = shape, tile = tile):
+                    np.testing.assert_array_equal(ca_numba.run_gol_active(heightmap, 12, tile),
+                                                  reference_gol(heightmap, 12))
+
+    def test_glider_crosses_skipped_tiles(self):
+        # Most tiles are empty and skipped, the glider has to wake the tiles it moves into
+        heightmap = np.zeros((40, 40), dtype = np.uint8)
+        heightmap[1:4, 1:4] = [[0, 1, 0],
+                               [0, 0, 1],
+                               [1, 1, 1]]
+        for tile in (4, 7):
+            with self.subTest(tile = tile):
+                np.testing.assert_array_equal(ca_numba.run_gol_active(heightmap, 60, tile),
+                                              reference_gol(heightmap, 60))
+
+    def test_stops_on_still_life(self):
+        # A block does not change, the result must be the same however many iterations are asked for
+        heightmap = np.zeros((10, 10), dtype = np.uint8)
+        heightmap[4:6, 4:6] = 1
+        np.testing.assert_array_equal(ca_numba.run_gol_active(heightmap, 1000), heightmap)
+
+if __name__ == '__main__':
+    unittest.main()
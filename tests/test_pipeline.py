@@ -0,0 +1,99 @@
+'''
+File: test_pipeline.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    Checks the Numba layers of pipeline, used by the 'numba' backend of Terrain.
+    Run from the repository root with: python -m unittest discover tests
+'''
+
+import unittest
+
+import numpy as np
+
+import functions.cellular_automata as ca
+from helpers import random_heightmap
+
+try:
+    import numba
+    import functions.pipeline as pipeline
+    from functions.cellular_automata_numba import ZOOM_IMPERFECTION
+except ImportError:
+    raise unittest.SkipTest('Numba is not installed.')
+
+# Shapes with odd sizes and single rows and columns
+SHAPES = [(1, 1), (1, 9), (9, 1), (5, 7), (33, 20)]
+
+class TestZoom(unittest.TestCase):
+
+    def test_matches_enlarged_layer(self):
+        # Zooming reads the small heightmap through floor division, it must give the same cells as
+        # enlarging the heightmap first and applying the zoom imperfection rule with the same seed.
+        # The rule only looks at the neighbours of 1 in 20 cells, so sparse heightmaps and several
+        # seeds are used to catch neighbours read from the wrong cell
+        for shape in SHAPES + [(60, 70)]:
+            for seed in range(50):
+                heightmap = random_heightmap(shape, seed, density = 0.05)
+                for zoom_factor in (1, 2, 3):
+                    with self.subTest(shape = shape, seed = seed, zoom_factor = zoom_factor):
+                        enlarged = heightmap.repeat(zoom_factor, 0).repeat(zoom_factor, 1)
+                        expected = np.empty_like(enlarged)
+                        pipeline._random_layer(enlarged, expected, ZOOM_IMPERFECTION, seed, np.empty(0))
+
+                        zoomed = np.empty_like(enlarged)
+                        pipeline.zoom(heightmap, zoomed, zoom_factor, seed)
+                        np.testing.assert_array_equal(zoomed, expected)
+
+class TestRandomLayers(unittest.TestCase):
+
+    def test_add_island_probabilities(self):
+        # With all probabilities 0 every cell survives and none are born, with all 1 it is reversed
+        heightmap = random_heightmap((23, 31))
+        result = np.empty_like(heightmap)
+        pipeline.add_island(heightmap, result, 5, np.zeros(9))
+        np.testing.assert_array_equal(result, heightmap)
+        pipeline.add_island(heightmap, result, 5, np.ones(9))
+        np.testing.assert_array_equal(result, 1 - heightmap)
+
+    def test_remove_ocean_keeps_land(self):
+        heightmap = random_heightmap((23, 31))
+        result = np.empty_like(heightmap)
+        pipeline.remove_ocean(heightmap, result, 5)
+        self.assertTrue(np.all(result[heightmap == 1] == 1))
+
+    def test_rows_only_depend_on_seed(self):
+        # Each row draws from its own generator, so adding rows below does not change the rows above
+        # the last shared row, whose neighbours differ
+        heightmap = random_heightmap((40, 50))
+        short = np.empty((30, 50), dtype = np.uint8)
+        full = np.empty_like(heightmap)
+        pipeline.add_island(heightmap[:30].copy(), short, 99, ca.ADD_ISLAND_PROBABILITIES)
+        pipeline.add_island(heightmap, full, 99, ca.ADD_ISLAND_PROBABILITIES)
+        np.testing.assert_array_equal(short[:29], full[:29])
+
+    def test_independent_of_threads(self):
+        # With a single thread there is nothing to compare against
+        if numba.config.NUMBA_NUM_THREADS == 1:
+            self.skipTest('Numba only has a single thread.')
+        heightmap = random_heightmap((64, 64))
+        results = []
+        for threads in (1, numba.config.NUMBA_NUM_THREADS):
+            numba.set_num_threads(threads)
+            result = np.empty_like(heightmap)
+            pipeline.add_island(heightmap, result, 7, ca.ADD_ISLAND_PROBABILITIES)
+            results.append(result)
+        numba.set_num_threads(numba.config.NUMBA_NUM_THREADS)
+        for result in results[1:]:
+            np.testing.assert_array_equal(result, results[0])
+
+    def test_same_seed_same_layer(self):
+        heightmap = random_heightmap((50, 50))
+        first, second, other = (np.empty_like(heightmap) for _ in range(3))
+        pipeline.add_island(heightmap, first, 3, ca.ADD_ISLAND_PROBABILITIES)
+        pipeline.add_island(heightmap, second, 3, ca.ADD_ISLAND_PROBABILITIES)
+        pipeline.add_island(heightmap, other, 4, ca.ADD_ISLAND_PROBABILITIES)
+        np.testing.assert_array_equal(first, second)
+        self.assertFalse(np.array_equal(first, other))
+
+if __name__ == '__main__':
+    unittest.main()
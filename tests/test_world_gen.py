@@ -0,0 +1,119 @@
+'''
+File: test_world_gen.py
+Github: https://github.com/dimitrivlachos/Procedural-Terrain-Heightmap-Generator
+
+Description:
+    Checks Terrain generation and saving.
+    Run from the repository root with: python -m unittest discover tests
+'''
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+import world_gen
+from world_gen import Terrain
+
+class TestTerrain(unittest.TestCase):
+
+    def test_rejects_empty_sizes(self):
+        for start_size in [(0, 4), (4, 0), (-1, 4)]:
+            with self.subTest(start_size = start_size):
+                with self.assertRaises(ValueError):
+                    Terrain(0, start_size = start_size)
+
+    def test_zoom_without_opencv(self):
+        # OpenCV only speeds up the enlargement, the heightmap must be the same without it
+        if world_gen.cv2 is None:
+            self.skipTest('OpenCV is not installed.')
+        terrain = Terrain(0, start_size = (3, 5))
+        terrain.generate()
+        with mock.patch.object(world_gen, 'cv2', None):
+            fallback = Terrain(0, start_size = (3, 5))
+            fallback.generate()
+        np.testing.assert_array_equal(terrain.heightmap, fallback.heightmap)
+
+class TestQuantize(unittest.TestCase):
+
+    def test_full_range(self):
+        heightmap = np.array([-2.0, -1.0, 0.0, 2.0])
+        np.testing.assert_array_equal(Terrain.quantize(heightmap), [0, 16384, 32768, 65535])
+
+    def test_clips_to_range(self):
+        heightmap = np.array([-1.0, 0.0, 0.5, 1.0, 2.0])
+        np.testing.assert_array_equal(Terrain.quantize(heightmap, 0, 1), [0, 0, 32768, 65535, 65535])
+
+    def test_flat_range(self):
+        np.testing.assert_array_equal(Terrain.quantize(np.full((2, 3), 7.0)), 0)
+        np.testing.assert_array_equal(Terrain.quantize(np.array([0.0, 1.0, 2.0]), 1, 1), 0)
+
+    def test_rejects_nan(self):
+        with self.assertRaises(ValueError):
+            Terrain.quantize(np.array([0.0, np.nan, 1.0]))
+
+    def test_rejects_reversed_range(self):
+        with self.assertRaises(ValueError):
+            Terrain.quantize(np.array([0.0, 1.0]), 1, 0)
+
+class TestSave(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.terrain = Terrain(0)
+        self.terrain.generate()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, filename):
+        return os.path.join(self.directory.name, filename)
+
+    def test_npy_round_trip(self):
+        filename = self.terrain.save(self.path('heightmap'))
+        self.assertTrue(filename.endswith('.npy'))
+        saved = np.load(filename)
+        self.assertEqual(saved.dtype, np.uint8)
+        np.testing.assert_array_equal(saved, self.terrain.heightmap)
+
+    def test_png_round_trip(self):
+        # The PNG must have a single 8 bit channel, land is white and ocean black
+        image = Image.open(self.terrain.save(self.path('heightmap.png')))
+        self.assertEqual(image.mode, 'L')
+        np.testing.assert_array_equal(np.asarray(image), self.terrain.heightmap * 255)
+
+    def test_float_png_is_16_bit(self):
+        self.terrain.heightmap = np.linspace(-1, 1, 12).reshape(3, 4)
+        image = Image.open(self.terrain.save(self.path('heightmap.png')))
+        self.assertEqual(image.mode, 'I;16')
+        np.testing.assert_array_equal(np.asarray(image), Terrain.quantize(self.terrain.heightmap))
+
+    def test_float_npy_round_trip(self):
+        self.terrain.heightmap = np.linspace(-1, 1, 12).reshape(3, 4)
+        saved = np.load(self.terrain.save(self.path('heightmap.npy'), value_range = (0, 1)))
+        np.testing.assert_array_equal(saved, Terrain.quantize(self.terrain.heightmap, 0, 1))
+
+    def test_flat_float_map(self):
+        self.terrain.heightmap = np.full((3, 4), 0.25)
+        for filename in ('heightmap.npy', 'heightmap.png'):
+            with self.subTest(filename = filename):
+                saved = self.terrain.save(self.path(filename))
+                loaded = np.load(saved) if filename.endswith('.npy') else np.asarray(Image.open(saved))
+                np.testing.assert_array_equal(loaded, 0)
+
+    def test_rejects_nan(self):
+        self.terrain.heightmap = np.array([[0.0, np.nan], [0.5, 1.0]])
+        for filename in ('heightmap.npy', 'heightmap.png'):
+            with self.subTest(filename = filename):
+                with self.assertRaises(ValueError):
+                    self.terrain.save(self.path(filename))
+
+    def test_not_generated(self):
+        with self.assertRaises(ValueError):
+            Terrain(0).save(self.path('heightmap.npy'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,11 +21,22 @@ Sources:
     https://www.alanzucconi.com/2022/06/05/minecraft-world-generation/
 '''
 
+import operator
+
 import numpy as np
-import functions.perlin_noise as pn
 import functions.cellular_automata as ca
 
-import matplotlib.pyplot as plt
+# Numba is optional, it is only needed by the 'numba' backend
+try:
+    import functions.pipeline as pipeline
+except ImportError:
+    pipeline = None
+
+# OpenCV is optional, it speeds up the enlargement of the 'numpy' backend zoom layer
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
 class Terrain:
     '''
@@ -37,13 +48,27 @@ class Terrain:
         The size of the heightmap in pixels. (x, y)
     seed : int
         The seed used to generate the heightmap.
+    zoom_factor : int
+        The factor by which each zoom layer enlarges the heightmap.
+    backend : str
+        The backend used to run the layers, one of BACKENDS.
 
     Methods
     -------
 
     '''
 
-    def __init__(self, seed, start_size = (4, 4)):
+    # Number of zoom layers in the cellular stack, used to size the heightmap buffers.
+    # Must match the __zoom calls in __cellular_stack, __spare_buffer checks that it does
+    ZOOM_LAYERS = 4
+
+    # Backends the layers can be run with. 'numpy' uses the vectorized rules of cellular_automata,
+    # 'numba' uses the compiled layers of pipeline. Both give valid heightmaps for a seed, but draw
+    # their random numbers differently so the heightmaps differ between backends.
+    # The GPU layers of cellular_automata_cuda are left out until they have run on a GPU
+    BACKENDS = ('numpy', 'numba')
+
+    def __init__(self, seed, start_size = (4, 4), zoom_factor = 2, backend = 'numpy'):
         '''
         Constructs all the necessary attributes for the terrain object.
 
@@ -54,28 +79,59 @@ class Terrain:
         size : tuple of ints
             The size of the initial seed-map. This will be 4096 times smaller than the final heightmap.
             Default is (4, 4) which will result in a 4x4 seed-map and a 16384x16384 pixel heightmap.
+        zoom_factor : int
+            The factor by which each zoom layer enlarges the heightmap. Default is 2.
+        backend : str
+            The backend used to run the layers, one of BACKENDS. Default is 'numpy'.
         '''
-        # Check that the seed is an int
-        if not isinstance(seed, int):
-            raise TypeError('Seed must be an int.')
+        # Check that the seed is an int, integer types such as numpy ints are accepted
+        try:
+            seed = operator.index(seed)
+        except TypeError:
+            raise TypeError('Seed must be an int.') from None
         
         # Check that the size is a tuple of ints
         if not isinstance(start_size, tuple):
             raise TypeError('Size must be a tuple of ints.')
-        if not isinstance(start_size[0], int) or not isinstance(start_size[1], int):
-            raise TypeError('Size must be a tuple of ints.')
         
         # Check that the size of size is 2
         if len(start_size) != 2:
             raise ValueError('Size must be a tuple of length 2. (x, y)')
 
+        try:
+            start_size = (operator.index(start_size[0]), operator.index(start_size[1]))
+        except TypeError:
+            raise TypeError('Size must be a tuple of ints.') from None
+        if start_size[0] < 1 or start_size[1] < 1:
+            raise ValueError('Size must be at least 1 along each axis.')
+
+        # Check that the zoom factor is an int greater than 0
+        try:
+            zoom_factor = operator.index(zoom_factor)
+        except TypeError:
+            raise TypeError('Zoom factor must be an int.') from None
+        if zoom_factor < 1:
+            raise ValueError('Zoom factor must be greater than 0.')
+
+        # Check that the backend exists and can be used
+        if backend not in self.BACKENDS:
+            raise ValueError(f'Backend must be one of {self.BACKENDS}.')
+        if backend == 'numba' and pipeline is None:
+            raise ImportError('Numba is required for the numba backend.')
+
         # If all checks pass, set the attributes
         self.seed = seed
         self.start_size = start_size
+        self.zoom_factor = zoom_factor
+        self.backend = backend
         self.size = start_size # This will be updated as the heightmap is generated
         self.is_generated = False
         self.heightmap = None
 
+        # Buffers the layers are written into while generating, see __allocate_buffers
+        self._buf_a = None
+        self._buf_b = None
+
         # Instantiate the random number generator
         self.rng = np.random.default_rng(seed = self.seed)
 
@@ -94,6 +150,66 @@ class Terrain:
         '''
         return f'Terrain object with seed {self.seed} and start size {self.start_size}.'
     
+    def __allocate_buffers(self):
+        '''
+        Allocates two buffers large enough to hold the final heightmap.
+        Every layer writes its result into the buffer that does not hold its input, so the
+        layers swap between the two buffers instead of allocating a new heightmap each.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        scale = self.zoom_factor ** self.ZOOM_LAYERS
+        cells = self.start_size[0] * scale * self.start_size[1] * scale
+        self._buf_a = np.empty(cells, dtype = np.uint8)
+        self._buf_b = np.empty(cells, dtype = np.uint8)
+
+    def __spare_buffer(self, heightmap, shape):
+        '''
+        Returns a view of the buffer that does not hold the given heightmap.
+
+        Parameters
+        ----------
+        heightmap : numpy array
+            The heightmap that must not be overwritten.
+        shape : tuple of ints
+            The shape of the view.
+
+        Returns
+        -------
+        buffer : numpy array
+            A contiguous view of the spare buffer with the given shape.
+        '''
+        buffer = self._buf_b if heightmap.base is self._buf_a else self._buf_a
+
+        # Check that the layer fits, the buffers only hold ZOOM_LAYERS zooms of the seed map
+        if shape[0] * shape[1] > buffer.size:
+            raise ValueError(f'A heightmap of shape {shape} does not fit in the buffers. '
+                             f'ZOOM_LAYERS ({self.ZOOM_LAYERS}) must match the number of zoom '
+                             'layers in the cellular stack.')
+
+        return buffer[:shape[0] * shape[1]].reshape(shape)
+
+    def __layer_seed(self):
+        '''
+        Draws the seed for the random numbers of a compiled layer from the random number generator.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        seed : int
+            The seed of the layer.
+        '''
+        return int(self.rng.integers(2**63))
+
     def __initialize_heightmap(self):
         '''
         Initializes the heightmap.
@@ -109,53 +225,65 @@ class Terrain:
         '''
 
         # Initialize the seed map / island layer
-        heightmap = np.zeros(self.start_size, dtype = int)
+        heightmap = self._buf_a[:self.start_size[0] * self.start_size[1]].reshape(self.start_size)
         
-        # Randomly set 1/10 of the pixels to 1
-        indices_to_flip = self.rng.random(heightmap.shape) < 0.1
-        heightmap[indices_to_flip] = 1
+        # Randomly set 1/10 of the pixels to 1 and the rest to 0 in a single pass.
+        # A pixel is set when its random digit from 0 to 9 is 0, drawing uint8 digits is cheaper
+        # than drawing float64s to compare against 0.1
+        digits = self.rng.integers(0, 10, size = self.start_size, dtype = np.uint8)
+        np.equal(digits, 0, out = heightmap)
 
         # Return the initialized heightmap
         return heightmap
 
-    def __zoom(self, heightmap, zoom_factor = 2):
+    def __zoom(self, heightmap):
         '''
-        'Zooms' in on the terrain object by the given factor (default is 2).
+        'Zooms' in on the terrain object by the zoom factor given on construction.
         This is done through the usage of cellular automata.
 
         Parameters
         ----------
         heightmap : numpy array
             The heightmap to zoom in on.
-        zoom_factor : int
-            The factor by which to zoom in on the terrain object. Default is 2.
 
         Returns
         -------
         zoomed_heightmap : numpy array
             The zoomed in heightmap.
         '''
-        # Check that the zoom factor is an int
-        if not isinstance(zoom_factor, int):
-            raise TypeError('Zoom factor must be an int.')
-        
-        # Check that the zoom factor is greater than 0
-        if zoom_factor < 1:
-            raise ValueError('Zoom factor must be greater than 0.')
-
-        # Increase the size of the heightmap by the zoom factor
-        zoomed_heightmap = np.kron(heightmap, np.ones((zoom_factor, zoom_factor)))
+        zoom_factor = self.zoom_factor
 
         # Increase the tracked size of the heightmap
         self.size = (self.size[0] * zoom_factor, self.size[1] * zoom_factor)
 
-        # Apply cellular automata to the zoomed heightmap
-        zoomed_heightmap = ca.cellular_automata(zoomed_heightmap, ca.zoom_imperfection, rng=self.rng)
+        # The compiled layer reads the heightmap through index arithmetic, without enlarging it first
+        if self.backend == 'numba':
+            zoomed_shape = (heightmap.shape[0] * zoom_factor, heightmap.shape[1] * zoom_factor)
+            zoomed_heightmap = self.__spare_buffer(heightmap, zoomed_shape)
+            pipeline.zoom(heightmap, zoomed_heightmap, zoom_factor, self.__layer_seed())
+            return zoomed_heightmap
+
+        # Increase the size of the heightmap by the zoom factor, repeating every cell into a
+        # zoom_factor x zoom_factor block, straight into the spare buffer
+        height, width = heightmap.shape
+        zoomed_heightmap = self.__spare_buffer(heightmap, (height * zoom_factor, width * zoom_factor))
+        if cv2 is not None:
+            # Nearest neighbour resizing is a SIMD copy loop in OpenCV, several times faster than broadcasting.
+            # OpenCV writes into dst when it fits and returns it, the result is kept in case it reallocated
+            zoomed_heightmap = cv2.resize(heightmap, (width * zoom_factor, height * zoom_factor),
+                                          dst = zoomed_heightmap, interpolation = cv2.INTER_NEAREST)
+        else:
+            # Broadcast the cells into the buffer viewed as (height, zoom_factor, width, zoom_factor)
+            zoomed_heightmap.reshape(height, zoom_factor, width, zoom_factor)[...] = heightmap[:, None, :, None]
+
+        # Apply cellular automata to the zoomed heightmap, into the buffer that held the heightmap
+        zoomed_heightmap = ca.cellular_automata_conv(zoomed_heightmap, 'zoom_imperfection', rng=self.rng,
+                                                     out=self.__spare_buffer(zoomed_heightmap, zoomed_heightmap.shape))
 
         # Return the zoomed heightmap
         return zoomed_heightmap
     
-    def __add_island(self, heightmap):
+    def __add_island(self, heightmap, iterations = 1):
         '''
         Uses cellular automata to add an island to the heightmap. Connecting existing islands together
         and eroding the edges of the island.
@@ -164,15 +292,22 @@ class Terrain:
         ----------
         heightmap : numpy array
             The heightmap to add an island to.
+        iterations : int
+            The number of times to apply the layer, at least 1. Default is 1.
 
         Returns
         -------
         island_heightmap : numpy array
             The heightmap with an island added to it.
         '''
-
-        # Initialize the island layer
-        heightmap = ca.cellular_automata(heightmap, ca.add_island, rng=self.rng)
+        # Apply the island layer, every iteration writes into the buffer that does not hold its input
+        for _ in range(iterations):
+            island_heightmap = self.__spare_buffer(heightmap, heightmap.shape)
+            if self.backend == 'numba':
+                pipeline.add_island(heightmap, island_heightmap, self.__layer_seed(), ca.ADD_ISLAND_PROBABILITIES)
+            else:
+                ca.cellular_automata_conv(heightmap, 'add_island', rng=self.rng, out=island_heightmap)
+            heightmap = island_heightmap
 
         # Return the island layer
         return heightmap
@@ -193,7 +328,12 @@ class Terrain:
         '''
 
         # Initialize the ocean layer
-        heightmap = ca.cellular_automata(heightmap, ca.remove_ocean, rng=self.rng)
+        ocean_heightmap = self.__spare_buffer(heightmap, heightmap.shape)
+        if self.backend == 'numba':
+            pipeline.remove_ocean(heightmap, ocean_heightmap, self.__layer_seed())
+        else:
+            ca.cellular_automata_conv(heightmap, 'remove_ocean', rng=self.rng, out=ocean_heightmap)
+        heightmap = ocean_heightmap
 
         # Return the ocean layer
         return heightmap
@@ -217,9 +357,7 @@ class Terrain:
         heightmap = self.__zoom(heightmap) # 4x4 -> 8x8 (4096 -> 2048)
         heightmap = self.__add_island(heightmap)
         heightmap = self.__zoom(heightmap)# 8x8 -> 16x16 (2048 -> 1024)
-        heightmap = self.__add_island(heightmap)
-        heightmap = self.__add_island(heightmap)
-        heightmap = self.__add_island(heightmap)
+        heightmap = self.__add_island(heightmap, iterations = 3)
         #heightmap = self.__remove_ocean(heightmap)
         heightmap = self.__zoom(heightmap) # 16x16 -> 32x32 (1024 -> 512)
         heightmap = self.__zoom(heightmap) # 32x32 -> 64x64 (512 -> 256)
@@ -227,8 +365,8 @@ class Terrain:
 
         # TODO: Add deep ocean
 
-        # Save the heightmap to text
-        #np.savetxt(f'heightmap_{self.seed}.txt', heightmap, fmt='%d')
+        # Save the heightmap, see save
+        #np.save(f'heightmap_{self.seed}.npy', heightmap)
 
         # Return the heightmap
         return heightmap
@@ -246,16 +384,129 @@ class Terrain:
         heightmap : numpy array
             The heightmap for the terrain object.
         '''
+        # Allocate the buffers the layers are written into
+        self.__allocate_buffers()
+
         # Initialize the heightmap
         heightmap = self.__initialize_heightmap()
 
         # Generate the first stack of layers
         heightmap = self.__cellular_stack(heightmap)
-        
+
         self.heightmap = heightmap
+        self.is_generated = True
+
+        # Release the buffers, the heightmap keeps the one it was written to alive
+        self._buf_a = None
+        self._buf_b = None
+
+    def save(self, filename = None, value_range = None):
+        '''
+        Saves the heightmap to a file.
+        Files ending in .png are saved as a single channel greyscale image, anything else is saved
+        in numpy's binary .npy format. Both are written directly from the array, unlike a text
+        format that has to format every cell. Floating point heightmaps are saved as uint16
+        elevations, see quantize. The binary land and ocean maps are saved as they are, or as an
+        8 bit image of 0 and 255 in a PNG.
+
+        Parameters
+        ----------
+        filename : str
+            The file to save the heightmap to. Default is heightmap_<seed>.npy.
+        value_range : tuple of floats
+            The heights mapped to black and white, or to 0 and 65535 in a quantized .npy file.
+            Only used for floating point heightmaps. Default is the lowest and highest height.
+            A flat heightmap is saved as all 0, one containing NaN cannot be saved.
+
+        Returns
+        -------
+        filename : str
+            The file the heightmap was saved to.
+        '''
+        # Check that the heightmap has been generated
+        if not self.is_generated:
+            raise ValueError('The heightmap must be generated before it can be saved.')
+
+        if filename is None:
+            filename = f'heightmap_{self.seed}.npy'
+
+        # Only floating point heightmaps are quantized, quantize defaults to their lowest and highest height
+        heightmap = self.heightmap
+        is_float = np.issubdtype(heightmap.dtype, np.floating)
+        if value_range is None:
+            value_range = (None, None)
+
+        filename = str(filename)
+        if filename.lower().endswith('.png'):
+            # Pillow is only imported when it is needed
+            from PIL import Image
+
+            # Write a single channel image, GIS tools read every channel of a PNG as a band.
+            # Binary maps are 8 bit black and white, floating point heightmaps 16 bit greyscale
+            if is_float:
+                image = Image.fromarray(self.quantize(heightmap, *value_range))
+            else:
+                image = Image.fromarray(np.multiply(heightmap, 255, dtype = np.uint8))
+            image.save(filename)
+        else:
+            if is_float:
+                heightmap = self.quantize(heightmap, *value_range)
+
+            # np.save adds the .npy extension if it is missing
+            if not filename.endswith('.npy'):
+                filename += '.npy'
+            np.save(filename, heightmap)
+
+        return filename
+
+    @staticmethod
+    def quantize(heightmap, low = None, high = None):
+        '''
+        Quantizes a floating point heightmap to uint16, the usual format of elevation maps in GIS
+        tools. Heights from low to high are scaled to the full range of uint16 and heights outside
+        of it are clipped, which takes a quarter of the memory of float64. If low equals high every
+        height is mapped to 0. NaN has no uint16 value, so heightmaps containing it are rejected.
+
+        Parameters
+        ----------
+        heightmap : numpy array of floats
+            The heightmap to quantize.
+        low : float
+            The height mapped to 0. Default is the lowest height of the heightmap.
+        high : float
+            The height mapped to 65535. Default is the highest height of the heightmap.
+
+        Returns
+        -------
+        heightmap : numpy array of uint16
+            The quantized heightmap.
+        '''
+        # Check that every height has a value, min and max would otherwise return NaN
+        if np.isnan(heightmap).any():
+            raise ValueError('The heightmap must not contain NaN.')
+
+        if low is None:
+            low = heightmap.min()
+        if high is None:
+            high = heightmap.max()
+
+        # Check that the range is not reversed
+        if high < low:
+            raise ValueError('The highest height must not be lower than the lowest height.')
+
+        # Work in float32, a single temporary that is clipped, shifted, scaled and rounded in place.
+        # A flat range leaves every height at low, which is shifted to 0
+        scaled = np.clip(heightmap, low, high, dtype = np.float32)
+        scaled -= np.float32(low)
+        if high > low:
+            scaled *= np.float32(np.iinfo(np.uint16).max / (high - low))
+        np.rint(scaled, out = scaled)
+        return scaled.astype(np.uint16)
 
 # Test code
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     terraintest = Terrain(0)
     terraintest.generate()
     plt.imshow(terraintest.heightmap, cmap='gray')